@@ -1,8 +1,11 @@
+import asyncio
 import re
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.responses import PlainTextResponse
 
+from services import claude_service, sheets_service
 from services.claude_service import estimate_calories, estimate_calories_edited
 from services.sheets_service import (
     delete_entry,
@@ -11,7 +14,22 @@ from services.sheets_service import (
     update_entry,
 )
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Pre-warm the expensive bits while the worker boots: the TLS session to
+    api.anthropic.com and the Google OAuth exchange. Both are best-effort, so
+    a warm-up hiccup never blocks the app from serving.
+    """
+    await asyncio.gather(
+        claude_service.warm_up(),
+        asyncio.to_thread(sheets_service.warm_up),
+    )
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 # The user's daily calorie target. Change this directly if your target changes.
 DAILY_CALORIE_TARGET = 2000
@@ -36,13 +54,36 @@ _WORD_TO_NUM = {
     "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20,
 }
 
+_NON_WORD_RE = re.compile(r"[^\w]")
+
 def _parse_num(s: str) -> int:
     """Convert a digit string or spelled-out number to int."""
-    s = re.sub(r"[^\w]", "", s).lower()  # strip punctuation, then lowercase
+    if s.isdigit():  # the common case ("delete 2") needs no cleanup at all
+        return int(s)
+    s = _NON_WORD_RE.sub("", s).lower()  # strip punctuation, then lowercase
     return _WORD_TO_NUM.get(s, None) or int(s)
 
 _NUM_PATTERN = r"(\d+|" + "|".join(_WORD_TO_NUM) + r")"
 
+# Compiled once at import. re.match() with a string pattern recompiles (or at
+# least consults the pattern cache) on every call; the delete/edit patterns are
+# also rebuilt by string concatenation each time, which defeats that cache.
+#
+# Delete matches: "delete 2", "remove 2", "delete entry 2", "delete three"
+# Edit matches:   "edit 2 sorry it was one egg",
+#                 "update 2: you overestimated the peanut butter",
+#                 "fix entry 2 it was salmon not chicken", "edit three ..."
+# Summary matches: "summary", "today", "total", "stats", "show"
+# (\b ensures "showing" or "totally" don't accidentally match.)
+_DELETE_RE = re.compile(
+    r"^(?:delete|remove)(?:\s+entry)?\s+" + _NUM_PATTERN + r"\b", re.IGNORECASE
+)
+_EDIT_RE = re.compile(
+    r"^(?:edit|update|change|fix|correct)(?:\s+entry)?\s+" + _NUM_PATTERN + r"[\s,;:.]+(.+)",
+    re.IGNORECASE,
+)
+_SUMMARY_RE = re.compile(r"^(?:summary|today|total|stats|show)\b", re.IGNORECASE)
+
 
 def classify_intent(text: str) -> dict:
     """
@@ -61,27 +102,16 @@ def classify_intent(text: str) -> dict:
     t = text.strip()
 
     # --- Delete ---
-    # Matches: "delete 2", "remove 2", "delete entry 2", "remove entry 2"
-    # Also matches spelled-out numbers: "delete three", "remove entry five"
-    m = re.match(r"^(?:delete|remove)(?:\s+entry)?\s+" + _NUM_PATTERN + r"\b", t, re.IGNORECASE)
+    m = _DELETE_RE.match(t)
     if m:
         return {"intent": "delete", "entry_num": _parse_num(m.group(1))}
 
     # --- Edit ---
-    # Matches: "edit 2 sorry it was one egg"
-    #          "update 2: I think you overestimated the peanut butter"
-    #          "fix entry 2 it was salmon not chicken"
-    # Also matches spelled-out numbers: "edit three it was salmon not chicken"
-    #
     # The entry number is captured as group 1.
     # Everything after the number (and optional colon/space) is the edit
     # instruction — it can be a full replacement description OR a natural
     # language correction. Claude figures out the difference (see handle_edit).
-    m = re.match(
-        r"^(?:edit|update|change|fix|correct)(?:\s+entry)?\s+" + _NUM_PATTERN + r"[\s,;:.]+(.+)",
-        t,
-        re.IGNORECASE,
-    )
+    m = _EDIT_RE.match(t)
     if m:
         return {
             "intent": "edit",
@@ -90,9 +120,7 @@ def classify_intent(text: str) -> dict:
         }
 
     # --- Summary ---
-    # Matches: "summary", "today", "total", "stats", "show"
-    # \b ensures "showing" or "totally" don't accidentally match.
-    if re.match(r"^(?:summary|today|total|stats|show)\b", t, re.IGNORECASE):
+    if _SUMMARY_RE.match(t):
         return {"intent": "summary"}
 
     # --- Default: log calories ---
@@ -107,14 +135,15 @@ def classify_intent(text: str) -> dict:
 # and returns a plain-text string to send back to the user.
 # ---------------------------------------------------------------------------
 
-def handle_log(description: str) -> str:
+async def handle_log(description: str) -> str:
     """Estimate calories for a new food entry and append it to the sheet."""
 
     # Ask Claude to estimate calories and break down the items
-    calorie_data = estimate_calories(description)
+    calorie_data = await estimate_calories(description)
 
-    # Write the row to Sheets; get back the entry's position today (for future edits)
-    entry_num, daily_total = log_entry(description, calorie_data)
+    # Write the row to Sheets; get back the entry's position today (for future edits).
+    # gspread is synchronous, so run it in a worker thread to keep the loop free.
+    entry_num, daily_total = await asyncio.to_thread(log_entry, description, calorie_data)
 
     # Build the itemized breakdown for the reply
     items_str = "\n".join(
@@ -131,7 +160,7 @@ def handle_log(description: str) -> str:
     )
 
 
-def handle_edit(entry_num: int, edit_instruction: str) -> str:
+async def handle_edit(entry_num: int, edit_instruction: str) -> str:
     """
     Edit an existing entry using a natural language instruction.
 
@@ -144,7 +173,11 @@ def handle_edit(entry_num: int, edit_instruction: str) -> str:
     # Fetch today's entries so we can pull the original description.
     # We need this because partial corrections like "it was one egg not two"
     # only make sense in the context of what was originally logged.
-    entries = get_today_entries()
+    #
+    # Note: this fetch and the Claude call below cannot run concurrently
+    # (e.g. via asyncio.gather) — Claude's prompt is built FROM the fetched
+    # original description, so the two steps are inherently sequential.
+    entries = await asyncio.to_thread(get_today_entries)
 
     # Validate the entry number before calling Claude, to avoid a wasted API call.
     if entry_num < 1 or entry_num > len(entries):
@@ -157,14 +190,14 @@ def handle_edit(entry_num: int, edit_instruction: str) -> str:
     # Pass both the original entry and the correction to Claude.
     # Claude returns updated calorie data plus a clean corrected_description
     # (the canonical text to store in the sheet going forward).
-    calorie_data = estimate_calories_edited(original_description, edit_instruction)
+    calorie_data = await estimate_calories_edited(original_description, edit_instruction)
 
     # Pull corrected_description out of the dict before passing to update_entry
     # (which only expects "items" and "total_calories")
     corrected_description = calorie_data.pop("corrected_description")
 
-    # Overwrite the row in Sheets and recalculate all of today's running totals
-    daily_total = update_entry(entry_num, corrected_description, calorie_data)
+    # Overwrite the row in Sheets; the F-column formulas pick up the new calories
+    daily_total = await asyncio.to_thread(update_entry, entry_num, corrected_description, calorie_data)
     remaining = DAILY_CALORIE_TARGET - daily_total
 
     return (
@@ -174,11 +207,11 @@ def handle_edit(entry_num: int, edit_instruction: str) -> str:
     )
 
 
-def handle_delete(entry_num: int) -> str:
-    """Remove an entry from the sheet and recalculate today's running totals."""
+async def handle_delete(entry_num: int) -> str:
+    """Remove an entry from the sheet and report the new daily total."""
 
     # delete_entry raises ValueError if entry_num is out of range
-    daily_total = delete_entry(entry_num)
+    daily_total = await asyncio.to_thread(delete_entry, entry_num)
     remaining = DAILY_CALORIE_TARGET - daily_total
 
     return (
@@ -188,10 +221,10 @@ def handle_delete(entry_num: int) -> str:
     )
 
 
-def handle_summary() -> str:
+async def handle_summary() -> str:
     """Return a numbered list of today's entries with a running total."""
 
-    entries = get_today_entries()
+    entries = await asyncio.to_thread(get_today_entries)
 
     if not entries:
         return f"No entries logged today.\nTarget: {DAILY_CALORIE_TARGET} cal"
@@ -235,13 +268,13 @@ async def webhook(request: Request):
     # Route to the right handler; catch any errors and surface them as readable text
     try:
         if intent["intent"] == "log":
-            reply = handle_log(intent["description"])
+            reply = await handle_log(intent["description"])
         elif intent["intent"] == "edit":
-            reply = handle_edit(intent["entry_num"], intent["edit_instruction"])
+            reply = await handle_edit(intent["entry_num"], intent["edit_instruction"])
         elif intent["intent"] == "delete":
-            reply = handle_delete(intent["entry_num"])
+            reply = await handle_delete(intent["entry_num"])
         elif intent["intent"] == "summary":
-            reply = handle_summary()
+            reply = await handle_summary()
         else:
             reply = "Unknown command."
     except Exception as e:
@@ -1,29 +1,113 @@
-import json
 import os
 
-from anthropic import Anthropic
-
-
-def _parse_response(response_text: str) -> dict:
+import httpx2
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+
+# One client for the lifetime of the process. Constructing a client per call
+# spins up a fresh httpx client, which means a new TCP + TLS handshake to
+# api.anthropic.com on every webhook (100-300 ms of avoidable latency). With a
+# module-level client, Keep-Alive lets every call after the first reuse the
+# established connection. HTTP/2 lets the edit flow's two sequential calls
+# share one multiplexed stream.
+#
+# The client is async so the 1-5 s Claude call yields the event loop instead
+# of stalling every other in-flight webhook for its full duration.
+# DefaultAsyncHttpxClient is the SDK's own client class — the SDK rejects a
+# plain httpx.AsyncClient, so customize pooling through its constructor.
+_HTTP_CLIENT = DefaultAsyncHttpxClient(
+    http2=True,
+    limits=httpx2.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0),
+    timeout=httpx2.Timeout(30.0, connect=5.0),
+)
+
+_CLIENT = AsyncAnthropic(
+    api_key=os.environ["ANTHROPIC_API_KEY"],
+    http_client=_HTTP_CLIENT,
+)
+
+
+async def warm_up() -> None:
     """
-    Parse Claude's text response into a Python dict.
+    Open the TLS connection to api.anthropic.com before the first real call.
 
-    Claude is instructed to return raw JSON, but sometimes wraps it in markdown
-    code fences (```json ... ```) despite the instructions. This strips those
-    fences before parsing so we don't blow up on valid-but-wrapped responses.
+    Called from the app's startup hook so a cold worker pays the TCP + TLS
+    handshake while booting instead of on the user's first log. Best-effort:
+    any response (even a 404 for the bare path) leaves a warm connection in
+    the keep-alive pool, and failures just mean the first call pays the
+    handshake like it used to.
     """
-    text = response_text.strip()
+    try:
+        await _HTTP_CLIENT.get(str(_CLIENT.base_url))
+    except Exception as e:
+        print(f"Anthropic warm-up skipped: {e}")
+
+# The estimates are small structured payloads (a handful of items plus totals),
+# so a 512-token budget is generous while halving the worst-case generation
+# time of the old 1024 cap — max_tokens bounds how long the model may stream.
+_MODEL = "claude-sonnet-4-20250514"
+_MAX_TOKENS = 512
+
+
+# ---------------------------------------------------------------------------
+# Tool definitions
+#
+# Forcing a tool call (tool_choice) makes Claude return the estimate as
+# structured data in the tool input, validated against the schema. The old
+# approach — asking for raw JSON in a text response — needed fence-stripping
+# and json.loads, and still failed occasionally when Claude wrapped the JSON
+# in markdown anyway.
+# ---------------------------------------------------------------------------
+
+_ITEMS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "name": {"type": "string"},
+            "calories": {"type": "integer"},
+        },
+        "required": ["name", "calories"],
+    },
+}
+
+_ESTIMATE_TOOL = {
+    "name": "record_calorie_estimate",
+    "description": "Record the itemized calorie estimate for what the user ate.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "items": _ITEMS_SCHEMA,
+            "total_calories": {"type": "integer"},
+        },
+        "required": ["items", "total_calories"],
+    },
+}
+
+_EDIT_TOOL = {
+    "name": "record_corrected_estimate",
+    "description": "Record the corrected description and updated calorie estimate.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "corrected_description": {
+                "type": "string",
+                "description": "Clean, complete description of what was actually eaten",
+            },
+            "items": _ITEMS_SCHEMA,
+            "total_calories": {"type": "integer"},
+        },
+        "required": ["corrected_description", "items", "total_calories"],
+    },
+}
 
-    # Strip opening fence line (e.g. "```json" or "```")
-    if text.startswith("```"):
-        text = text.split("\n", 1)[1]       # drop the first line
-        text = text.rsplit("```", 1)[0]     # drop everything after the closing fence
-        text = text.strip()
 
-    return json.loads(text)
+def _tool_input(message) -> dict:
+    """Pull the forced tool call's input dict out of a Messages response."""
+    block = next(b for b in message.content if b.type == "tool_use")
+    return block.input
 
 
-def estimate_calories(food_description: str) -> dict:
+async def estimate_calories(food_description: str) -> dict:
     """
     Send a plain-text food description to Claude and get back a calorie estimate.
 
@@ -36,32 +120,23 @@ def estimate_calories(food_description: str) -> dict:
             "total_calories": int,
         }
     """
-    client = Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
-
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1024,
+    message = await _CLIENT.messages.create(
+        model=_MODEL,
+        max_tokens=_MAX_TOKENS,
         messages=[{"role": "user", "content": food_description}],
+        tools=[_ESTIMATE_TOOL],
+        tool_choice={"type": "tool", "name": "record_calorie_estimate"},
         system="""You are a calorie estimation assistant. The user will describe what they ate.
 
-Respond ONLY with valid JSON in this exact format, no other text:
-{
-    "items": [
-        {"name": "item name", "calories": 200},
-        {"name": "item name", "calories": 150}
-    ],
-    "total_calories": 350
-}
-
-Do NOT wrap your response in markdown code fences or backticks. Return raw JSON only.
+Record your estimate with the record_calorie_estimate tool.
 Be reasonable with estimates. Use typical serving sizes when not specified.
 Round calories to the nearest 5.""",
     )
 
-    return _parse_response(message.content[0].text)
+    return _tool_input(message)
 
 
-def estimate_calories_edited(original_description: str, edit_instruction: str) -> dict:
+async def estimate_calories_edited(original_description: str, edit_instruction: str) -> dict:
     """
     Re-estimate calories for an entry the user wants to correct.
 
@@ -83,8 +158,6 @@ def estimate_calories_edited(original_description: str, edit_instruction: str) -
             "total_calories": int,
         }
     """
-    client = Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
-
     # The user message gives Claude both the original entry and the correction.
     # Formatting it this way makes the relationship between them unambiguous.
     user_message = (
@@ -92,10 +165,12 @@ def estimate_calories_edited(original_description: str, edit_instruction: str) -
         f"Correction: {edit_instruction}"
     )
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1024,
+    message = await _CLIENT.messages.create(
+        model=_MODEL,
+        max_tokens=_MAX_TOKENS,
         messages=[{"role": "user", "content": user_message}],
+        tools=[_EDIT_TOOL],
+        tool_choice={"type": "tool", "name": "record_corrected_estimate"},
         system="""You are a calorie estimation assistant helping a user correct a food log entry.
 
 You will receive:
@@ -104,23 +179,13 @@ You will receive:
 
 The correction might be a full replacement ("one egg, toast, OJ") or a partial note
 ("sorry it was one egg not two" / "I think you overestimated the peanut butter").
-Apply the correction and return updated calorie estimates.
-
-Respond ONLY with valid JSON in this exact format, no other text:
-{
-    "corrected_description": "full corrected description of what was eaten",
-    "items": [
-        {"name": "item name", "calories": 200},
-        {"name": "item name", "calories": 150}
-    ],
-    "total_calories": 350
-}
+Apply the correction and record the updated estimate with the
+record_corrected_estimate tool.
 
 Rules:
 - corrected_description should be a clean, complete description of what was actually eaten
 - If calories were disputed ("you overestimated X"), use better judgment for that item
-- Round calories to the nearest 5
-- Do NOT wrap your response in markdown code fences. Return raw JSON only.""",
+- Round calories to the nearest 5""",
     )
 
-    return _parse_response(message.content[0].text)
+    return _tool_input(message)
@@ -1,10 +1,15 @@
 import json
 import os
+import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
 import gspread
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
+from gspread.utils import DateTimeOption, ValueRenderOption
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 TZ = ZoneInfo("America/New_York")
@@ -21,89 +26,182 @@ COL_TIME = 2    # B — HH:MM AM/PM (Eastern)
 COL_DESC = 3    # C — what the user typed (or corrected_description after an edit)
 COL_ITEMS = 4   # D — "item (cal), item (cal)" breakdown string
 COL_CALS = 5    # E — calories for this single entry
-COL_DAILY = 6   # F — running daily total; recalculated on every write
+COL_DAILY = 6   # F — daily total; a SUMIF formula written once at append time
+
+# ---------------------------------------------------------------------------
+# Process-local cache of today's entry count and calorie total, keyed by date
+# string. Without it, every log downloads the entire (ever-growing) sheet just
+# to sum today's calories. A warm serverless worker fetches once per day, then
+# increments in memory; keying on the date makes rollover a natural cache miss.
+# Edits and deletes refresh it from their snapshot. Worst case
+# (several cold workers) a stale miss just costs the fetch we used to always do.
+# ---------------------------------------------------------------------------
+_DAILY_TOTAL_CACHE: dict[str, dict] = {}
+
+# Same idea for the full entry list that summary/edit need: one fetch per warm
+# worker per day instead of one per request. log_entry appends to it in place
+# (it has every field the entry dicts carry); edits and deletes just drop it,
+# since their row rewrites are cheaper to refetch than to mirror.
+_ENTRIES_CACHE: dict[str, list] = {}
+
+# The raw snapshot gets a short TTL of its own: a summary followed seconds
+# later by an edit (the typical correction flow) reuses one A2:E read instead
+# of two. Writes invalidate it outright, so the staleness window only applies
+# between reads and is bounded by the TTL.
+_SNAPSHOT_TTL_SECONDS = 15.0
+_SNAPSHOT_CACHE: dict | None = None
+
+
+def _invalidate_snapshot() -> None:
+    """Drop the cached snapshot after any write, so the next read re-fetches."""
+    global _SNAPSHOT_CACHE
+    _SNAPSHOT_CACHE = None
+
+
+def _cache_today(today: str, count: int, total: int) -> None:
+    """Replace the cache with fresh count/total figures for today."""
+    _DAILY_TOTAL_CACHE.clear()  # drop stale dates so the dict never grows
+    _DAILY_TOTAL_CACHE[today] = {"count": count, "total": total}
 
 
 # ---------------------------------------------------------------------------
 # Internal helpers (prefixed with _ to signal they're not part of the public API)
 # ---------------------------------------------------------------------------
 
+# Memoized credentials and worksheet handle. Authorizing gspread means parsing
+# the multi-KB service account JSON and doing an OAuth token exchange — fine
+# once per cold start, wasteful on every request. google-auth refreshes the
+# token under the hood when it expires, so the handle stays valid for the life
+# of the worker.
+_CREDENTIALS = None
+_SHEET = None
+
+# Transient 429s (rate limit) and 5xxs are routine with the Sheets API, and
+# without retries they surface as webhook failures on the user's phone.
+# Truncated exponential backoff with jitter is what Google recommends; the
+# Retry also honors any Retry-After header a 429 carries. POST is included
+# deliberately — a rejected write (429/503) was not applied, so resending it
+# is safe.
+_SHEETS_RETRY = Retry(
+    total=5,
+    backoff_factor=0.5,
+    backoff_jitter=0.5,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=frozenset(["GET", "POST", "PUT", "PATCH"]),
+)
+
+
+def _get_credentials() -> Credentials:
+    """
+    Parse the GOOGLE_CREDENTIALS env var (the full JSON of a GCP service
+    account key, set in Vercel's project settings) exactly once per worker.
+    """
+    global _CREDENTIALS
+    if _CREDENTIALS is None:
+        creds_json = json.loads(os.environ["GOOGLE_CREDENTIALS"])
+        _CREDENTIALS = Credentials.from_service_account_info(creds_json, scopes=SCOPES)
+    return _CREDENTIALS
+
+
 def _get_sheet():
     """
     Authenticate with the Google Sheets API and return the first sheet object.
 
-    Credentials come from the GOOGLE_CREDENTIALS env var, which should be the
-    full JSON of a GCP service account key (set in Vercel's project settings).
+    The authorized handle is cached at module scope after the first call.
+    Every call goes through a session with retry-with-backoff mounted, so
+    transient 429/5xx responses are absorbed instead of failing the webhook.
     """
-    creds_json = json.loads(os.environ["GOOGLE_CREDENTIALS"])
-    creds = Credentials.from_service_account_info(creds_json, scopes=SCOPES)
-    client = gspread.authorize(creds)
-    return client.open_by_key(os.environ["GOOGLE_SHEET_ID"]).sheet1
+    global _SHEET
+    if _SHEET is None:
+        session = AuthorizedSession(_get_credentials())
+        session.mount("https://", HTTPAdapter(max_retries=_SHEETS_RETRY))
+        client = gspread.authorize(_get_credentials(), session=session)
+        _SHEET = client.open_by_key(os.environ["GOOGLE_SHEET_ID"]).sheet1
+    return _SHEET
 
 
-def _today_str() -> str:
-    """Return today's date as YYYY-MM-DD in Eastern time."""
-    return datetime.now(TZ).strftime("%Y-%m-%d")
+def _today_str(now: datetime | None = None) -> str:
+    """Return the date as YYYY-MM-DD in Eastern time (defaults to now)."""
+    return (now or datetime.now(TZ)).strftime("%Y-%m-%d")
 
 
-def _now_time_str() -> str:
-    """Return the current time as HH:MM AM/PM in Eastern time."""
-    return datetime.now(TZ).strftime("%I:%M %p")
+def _now_time_str(now: datetime | None = None) -> str:
+    """Return the time as HH:MM AM/PM in Eastern time (defaults to now)."""
+    return (now or datetime.now(TZ)).strftime("%I:%M %p")
 
 
-def _get_today_row_indices(sheet, today: str) -> list[int]:
-    """
-    Return the 1-based sheet row indices for all of today's entries.
+def _row_cals(row: list) -> int:
+    """Column E of a fetched row as an int; missing or malformed cells count as 0."""
+    v = row[COL_CALS - 1] if len(row) >= COL_CALS else ""
+    if isinstance(v, (int, float)):  # the unformatted read returns native numbers
+        return int(v)
+    return int(v) if v.isdigit() else 0
 
-    Row 1 is always the header, so data starts at row 2. The returned indices
-    are in chronological order (top to bottom in the sheet), which is the same
-    order the user sees when they ask for a summary and how edit/delete entry
-    numbers are assigned.
 
-    Example: if today has 3 entries at rows 5, 6, 7, this returns [5, 6, 7].
-    Entry #1 → row 5, Entry #2 → row 6, Entry #3 → row 7.
+def _fetch_today_snapshot(sheet, today: str) -> dict:
     """
-    all_rows = sheet.get_all_values()  # returns every row as a list of strings
+    Fetch today's entries once and answer every question the callers have.
 
-    # all_rows[0] is the header (sheet row 1).
-    # all_rows[1] is the first data row (sheet row 2), hence the +2 offset.
-    return [
-        i + 2
-        for i, row in enumerate(all_rows[1:])
-        if row and row[0] == today  # column A holds the date
-    ]
+    Returns {"indices": [...], "rows": [...]} — parallel lists of the 1-based
+    sheet row index and the A-E cell values for each of today's entries, in
+    chronological order (top to bottom in the sheet). That order is how summary
+    numbers the entries and how edit/delete entry numbers are assigned:
+    if today sits at rows 5, 6, 7, then Entry #1 → row 5, Entry #2 → row 6.
 
+    One "A2:E" read serves index lookup, per-row reads, and total sums; the
+    previous shape — an index fetch plus a row_values() round-trip per row —
+    cost 1 + N API calls for the same information. "A2:E" skips the header, so
+    result index i corresponds to sheet row i + 2.
 
-def _recalculate_daily_totals(sheet, today: str) -> int:
+    A fresh-enough snapshot (see _SNAPSHOT_TTL_SECONDS) is served from memory,
+    so read-then-write sequences like summary → edit share a single fetch.
     """
-    Walk through today's entries in order and write a running total to column F.
+    global _SNAPSHOT_CACHE
+    cached = _SNAPSHOT_CACHE
+    if (
+        cached is not None
+        and cached["date"] == today
+        and time.monotonic() - cached["fetched_at"] < _SNAPSHOT_TTL_SECONDS
+    ):
+        return cached["snapshot"]
+
+    # UNFORMATTED_VALUE returns column E as native numbers, skipping the
+    # per-row string parse and any locale grouping ("1,234"). Dates and times
+    # still come back as their displayed strings (FORMATTED_STRING), so the
+    # column-A comparison against today's YYYY-MM-DD string keeps working.
+    rows = sheet.get(
+        "A2:E",
+        value_render_option=ValueRenderOption.unformatted,
+        date_time_render_option=DateTimeOption.formatted_string,
+    )
 
-    This is called after every edit or delete to keep the daily total column
-    accurate. (After a plain log we already know the total, so we write it
-    directly in log_entry instead of calling this.)
+    indices, today_rows = [], []
+    for i, row in enumerate(rows):
+        if row and row[0] == today:  # column A holds the date
+            indices.append(i + 2)
+            today_rows.append(row)
 
-    Returns the final daily total after all entries are summed.
-    """
-    row_indices = _get_today_row_indices(sheet, today)
-    running = 0
-    for row_idx in row_indices:
-        row = sheet.row_values(row_idx)
-        try:
-            # Column E holds the per-entry calorie count
-            entry_cals = int(row[COL_CALS - 1])
-        except (ValueError, IndexError):
-            # Defensive: skip rows with missing or non-numeric calorie values
-            entry_cals = 0
-        running += entry_cals
-        # Write the running total to column F for this row
-        sheet.update_cell(row_idx, COL_DAILY, running)
-    return running
+    snapshot = {"indices": indices, "rows": today_rows}
+    _SNAPSHOT_CACHE = {"date": today, "snapshot": snapshot, "fetched_at": time.monotonic()}
+    return snapshot
 
 
 # ---------------------------------------------------------------------------
 # Public API — called from api/webhook.py
 # ---------------------------------------------------------------------------
 
+def warm_up() -> None:
+    """
+    Run the gspread authorization during app startup instead of on the first
+    request. Best-effort — if it fails (e.g. transient network), the first
+    real call simply authorizes the way it always did.
+    """
+    try:
+        _get_sheet()
+    except Exception as e:
+        print(f"Sheets warm-up skipped: {e}")
+
+
 def log_entry(description: str, calorie_data: dict) -> tuple[int, int]:
     """
     Append a new calorie entry to the sheet.
@@ -121,7 +219,11 @@ def log_entry(description: str, calorie_data: dict) -> tuple[int, int]:
         - daily_total: Running calorie total for today after this entry.
     """
     sheet = _get_sheet()
-    today = _today_str()
+    # One clock read for both strings, so a log straddling midnight can't get
+    # yesterday's date paired with this morning's time
+    now = datetime.now(TZ)
+    today = _today_str(now)
+    time_str = _now_time_str(now)
 
     # Build a human-readable items string for column D: "Egg (90), Toast (120)"
     items_breakdown = ", ".join(
@@ -129,30 +231,63 @@ def log_entry(description: str, calorie_data: dict) -> tuple[int, int]:
         for item in calorie_data["items"]
     )
 
-    # Sum up calories from existing entries today to get the new running total
-    existing_indices = _get_today_row_indices(sheet, today)
-    running_total = 0
-    for idx in existing_indices:
-        row = sheet.row_values(idx)
-        try:
-            running_total += int(row[COL_CALS - 1])
-        except (ValueError, IndexError):
-            pass  # skip malformed rows
-
-    daily_total = running_total + calorie_data["total_calories"]
-
-    # Append the new row at the bottom of the sheet
-    sheet.append_row([
-        today,
-        _now_time_str(),
-        description,
-        items_breakdown,
-        calorie_data["total_calories"],
-        daily_total,
-    ])
+    # Get today's existing entry count and calorie total — from the cache when
+    # this worker has seen today already, otherwise from one sheet fetch.
+    cached = _DAILY_TOTAL_CACHE.get(today)
+    if cached is None:
+        snapshot = _fetch_today_snapshot(sheet, today)
+        cached = {
+            "count": len(snapshot["rows"]),
+            "total": sum(_row_cals(r) for r in snapshot["rows"]),
+        }
+
+    # Column F gets a SUMIF formula instead of a precomputed number, so Sheets
+    # sums today's calories server-side. The formula self-references its own
+    # row via INDIRECT because we don't know the row number until the append
+    # lands. Asking for the values back in the append response means the whole
+    # log write is a single round-trip — no follow-up read needed.
+    daily_total_formula = '=SUMIF(A:A, INDIRECT("A"&ROW()), E:E)'
+
+    resp = sheet.spreadsheet.values_append(
+        sheet.title,
+        params={
+            "valueInputOption": "USER_ENTERED",
+            "insertDataOption": "INSERT_ROWS",
+            "includeValuesInResponse": "true",
+            "responseValueRenderOption": "UNFORMATTED_VALUE",
+        },
+        body={"values": [[
+            today,
+            time_str,
+            description,
+            items_breakdown,
+            calorie_data["total_calories"],
+            daily_total_formula,
+        ]]},
+    )
+
+    # The computed F value from the response is authoritative — it also picks
+    # up entries another worker may have logged since our cache was filled.
+    try:
+        daily_total = int(resp["updates"]["updatedData"]["values"][0][COL_DAILY - 1])
+    except (KeyError, IndexError, TypeError, ValueError):
+        daily_total = cached["total"] + calorie_data["total_calories"]
+
+    # The snapshot no longer reflects the sheet (it lacks the new row)
+    _invalidate_snapshot()
 
     # entry_num is how many entries existed before this one, plus 1
-    entry_num = len(existing_indices) + 1
+    entry_num = cached["count"] + 1
+    _cache_today(today, entry_num, daily_total)
+
+    # Keep the entries cache in step — we know every field the new entry needs
+    if today in _ENTRIES_CACHE:
+        _ENTRIES_CACHE[today].append({
+            "time":        time_str,
+            "description": description,
+            "items":       items_breakdown,
+            "calories":    calorie_data["total_calories"],
+        })
     return entry_num, daily_total
 
 
@@ -171,26 +306,33 @@ def get_today_entries() -> list[dict]:
     """
     sheet = _get_sheet()
     today = _today_str()
-    row_indices = _get_today_row_indices(sheet, today)
+
+    # Serve from the worker-local cache when we already have today's list
+    cached = _ENTRIES_CACHE.get(today)
+    if cached is not None:
+        return cached
+
+    snapshot = _fetch_today_snapshot(sheet, today)
 
     entries = []
-    for idx in row_indices:
-        row = sheet.row_values(idx)
+    for row in snapshot["rows"]:
         # Use .get-style access with len() guards so missing columns don't crash
         entries.append({
             "time":        row[COL_TIME  - 1] if len(row) >= COL_TIME  else "",
             "description": row[COL_DESC  - 1] if len(row) >= COL_DESC  else "",
             "items":       row[COL_ITEMS - 1] if len(row) >= COL_ITEMS else "",
-            "calories":    int(row[COL_CALS - 1])
-                           if len(row) >= COL_CALS and row[COL_CALS - 1] else 0,
+            "calories":    _row_cals(row),
         })
+
+    _ENTRIES_CACHE.clear()  # drop stale dates so the dict never grows
+    _ENTRIES_CACHE[today] = entries
     return entries
 
 
 def update_entry(entry_num: int, new_description: str, calorie_data: dict) -> int:
     """
-    Overwrite an existing entry's description and calorie data, then
-    recalculate daily totals for all of today's entries.
+    Overwrite an existing entry's description and calorie data. Column F
+    maintains itself — it holds SUMIF formulas — so no totals are rewritten.
 
     Args:
         entry_num:       1-based index of today's entry to update.
@@ -198,12 +340,15 @@ def update_entry(entry_num: int, new_description: str, calorie_data: dict) -> in
                          corrected_description field), stored in col C.
         calorie_data:    Updated {"items": [...], "total_calories": int} from Claude.
 
-    Returns the new daily total after recalculation.
+    Returns the new daily total.
     Raises ValueError if entry_num is out of range.
     """
     sheet = _get_sheet()
     today = _today_str()
-    row_indices = _get_today_row_indices(sheet, today)
+
+    # One snapshot serves validation, the target-row lookup, and the new total
+    snapshot = _fetch_today_snapshot(sheet, today)
+    row_indices = snapshot["indices"]
 
     # Validate before touching the sheet
     if entry_num < 1 or entry_num > len(row_indices):
@@ -220,28 +365,39 @@ def update_entry(entry_num: int, new_description: str, calorie_data: dict) -> in
         for item in calorie_data["items"]
     )
 
-    # Update columns C, D, E in place — time (col B) stays the same
-    sheet.update_cell(target_row, COL_DESC,  new_description)
-    sheet.update_cell(target_row, COL_ITEMS, items_breakdown)
-    sheet.update_cell(target_row, COL_CALS,  calorie_data["total_calories"])
+    # Overwrite C-E in one ranged write — time (col B) stays the same. Column F
+    # needs no rewrite at all: every row's F holds a SUMIF formula, so Sheets
+    # reflects the new calorie value the moment E changes.
+    sheet.update(
+        [[new_description, items_breakdown, calorie_data["total_calories"]]],
+        f"C{target_row}:E{target_row}",
+        value_input_option="USER_ENTERED",
+    )
+
+    # The new daily total falls out of the snapshot we already hold
+    daily_total = sum(
+        calorie_data["total_calories"] if idx == target_row else _row_cals(row)
+        for idx, row in zip(row_indices, snapshot["rows"])
+    )
+    _cache_today(today, len(row_indices), daily_total)
 
-    # Recalculate running totals for all of today's rows so col F stays accurate
-    return _recalculate_daily_totals(sheet, today)
+    # Both caches now hold pre-edit data — drop them
+    _invalidate_snapshot()
+    _ENTRIES_CACHE.pop(today, None)
+    return daily_total
 
 
 def delete_entry(entry_num: int) -> int:
     """
-    Remove an entry row from the sheet and recalculate daily totals.
-
-    After deletion, _recalculate_daily_totals re-fetches today's row indices
-    from the sheet, so the deleted row is already gone from its count.
+    Remove an entry row from the sheet.
 
     Returns the new daily total (0 if no entries remain today).
     Raises ValueError if entry_num is out of range.
     """
     sheet = _get_sheet()
     today = _today_str()
-    row_indices = _get_today_row_indices(sheet, today)
+    snapshot = _fetch_today_snapshot(sheet, today)
+    row_indices = snapshot["indices"]
 
     # Validate before touching the sheet
     if entry_num < 1 or entry_num > len(row_indices):
@@ -249,9 +405,21 @@ def delete_entry(entry_num: int) -> int:
         noun = "entry" if count == 1 else "entries"
         raise ValueError(f"Entry #{entry_num} not found. You have {count} {noun} today.")
 
-    # Delete the target row; all rows below it shift up automatically in Sheets
+    # Delete the target row; all rows below it shift up automatically in
+    # Sheets, and the remaining rows' relative F formulas re-evaluate on their
+    # own — no recalculation writes needed.
     target_row = row_indices[entry_num - 1]
     sheet.delete_rows(target_row)
 
-    # Recalculate totals for whatever entries remain today
-    return _recalculate_daily_totals(sheet, today)
+    # The new daily total is the snapshot's sum minus the deleted row
+    daily_total = sum(
+        _row_cals(row)
+        for idx, row in zip(row_indices, snapshot["rows"])
+        if idx != target_row
+    )
+    _cache_today(today, len(row_indices) - 1, daily_total)
+
+    # Both caches still contain the deleted row — drop them
+    _invalidate_snapshot()
+    _ENTRIES_CACHE.pop(today, None)
+    return daily_total